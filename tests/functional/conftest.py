@@ -1,14 +1,20 @@
 # SPDX-FileCopyrightText: 2025 - Canonical Ltd
 # SPDX-License-Identifier: Apache-2.0
 
+from __future__ import annotations
+
+import base64
 import secrets
-import string
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import pytest
 
 from . import utils
 
+if TYPE_CHECKING:
+    import openstack
+
 
 def pytest_addoption(parser):
     parser.addoption(
@@ -42,12 +48,16 @@ def unique_id() -> str:
     application credential to identify them easily in the deployed
     environment.
     """
-    length = 8
-    # Use ascii_lowercase to follow k8s naming convention for release names etc
-    random_string = "".join(
-        secrets.choice(string.ascii_lowercase + string.digits) for _ in range(length)
-    )
-    return random_string
+    # Rehydrate the previous run's ID under DEBUG_CACHING so the whole
+    # session addresses the resources that run created
+    cached = utils.load_debug_cache()
+    if cached:
+        return cached["unique_id"]
+
+    # Use lowercase base32 to follow k8s naming convention for release
+    # names etc; 5 random bytes encode to exactly 8 characters and need
+    # a single urandom read instead of one per character
+    return base64.b32encode(secrets.token_bytes(5)).decode().lower()
 
 
 @pytest.fixture(scope="session")
@@ -58,25 +68,88 @@ def config_path(tmp_path_factory) -> Path:
 
 
 @pytest.fixture(scope="session")
-def value_overrides(config_path, unique_id) -> dict:
+def os_conn() -> openstack.connection.Connection:
+    """Openstack connection shared across the session.
+
+    Reusing one connection avoids per-call CLI interpreter startup and
+    keystone token round-trips.
+    """
+    return utils.get_openstack_connection()
+
+
+@pytest.fixture(scope="session")
+def openstack_inventory(os_conn) -> dict:
+    """Preloaded openstack resource IDs keyed by resource name."""
+    return utils.get_openstack_inventory(os_conn)
+
+
+@pytest.fixture(scope="session")
+def value_overrides(request, config_path, unique_id) -> dict:
     """Return values yaml to create cluster."""
-    return utils.generate_values(config_path, unique_id)
+    cached = utils.load_debug_cache()
+    if cached:
+        return cached["values"]
+
+    # The connection and inventory fixtures are requested lazily so a
+    # cache hit skips their API calls as well
+    values = utils.generate_values(
+        request.getfixturevalue("os_conn"),
+        config_path,
+        unique_id,
+        request.getfixturevalue("openstack_inventory"),
+    )
+    utils.save_debug_cache({"unique_id": unique_id, "values": values})
+    return values
+
+
+@pytest.fixture(scope="session")
+def namespace(unique_id) -> str:
+    """Namespace hosting the workload cluster resources."""
+    return f"{utils.NAMESPACE}-{unique_id}"
+
+
+@pytest.fixture(scope="session")
+def cluster_name(unique_id) -> str:
+    """Name of the workload cluster."""
+    return f"{utils.CLUSTER_NAME}-{unique_id}"
 
 
 @pytest.fixture(scope="session")
-def setup():
+def management_kubeconfig(config_path) -> Path:
+    """Kubeconfig file for the CAPI management cluster."""
+    kubeconfig = config_path / "mgmt_kubeconfig"
+    utils.get_management_cluster_kubeconfig(kubeconfig)
+    return kubeconfig
+
+
+@pytest.fixture(scope="session")
+def workload_kubeconfig(
+    namespace, cluster_name, management_kubeconfig, config_path
+) -> Path:
+    """Kubeconfig file for the workload cluster.
+
+    Fetched once per session; must only be requested by tests that run
+    after the cluster has been deployed.
+    """
+    kubeconfig = config_path / "workload_kubeconfig"
+    utils.get_workload_kubeconfig(
+        namespace, cluster_name, management_kubeconfig, kubeconfig
+    )
+    return kubeconfig
+
+
+@pytest.fixture(scope="session")
+def setup(os_conn):
     """Add tags to image."""
+    image = os_conn.image.find_image("ubuntu", ignore_missing=False)
+    # Skip the mutation when a previous run already tagged the image
+    if image.properties.get("kube_version") == "v1.32.6":
+        return
+
     # Add property tags to image
-    cmd = [
-        "openstack",
-        "image",
-        "set",
-        "ubuntu",
-        "--os-distro",
-        "ubuntu",
-        "--os-version",
-        "24.04",
-        "--property",
-        "kube_version=v1.32.6",
-    ]
-    utils.run_openstack_command(utils.CLOUD_ADMIN, cmd, capture_output=False)
+    os_conn.image.update_image(
+        image,
+        os_distro="ubuntu",
+        os_version="24.04",
+        kube_version="v1.32.6",
+    )
@@ -1,10 +1,9 @@
 # SPDX-FileCopyrightText: 2025 - Canonical Ltd
 # SPDX-License-Identifier: Apache-2.0
 
+import json
 from pathlib import Path
 
-import yaml
-
 from . import utils
 
 
@@ -20,9 +19,7 @@ def _create_cluster(
     openstack_cluster_chart_version: str,
     values_file: Path,
 ):
-    cmd = [
-        "sudo",
-        "k8s",
+    cmd = utils.k8s_command(
         "helm",
         "upgrade",
         cluster_name,
@@ -41,54 +38,49 @@ def _create_cluster(
         openstack_cluster_chart_version,
         "--values",
         str(values_file),
-    ]
-    utils.run_command(cmd, capture_output=False)
-
-
-def _wait_for_cluster(namespace: str, cluster_name: str, timeout: int):
-    cmd = [
-        "sudo",
-        "k8s",
-        "kubectl",
-        "wait",
-        "--namespace",
-        namespace,
-        '--for=jsonpath={.status.v1beta2.conditions[?(@.type=="Available")].status}=True',
-        f"cluster/{cluster_name}",
-        f"--timeout={timeout}s",
-    ]
+    )
     utils.run_command(cmd, capture_output=False)
 
 
-def _get_management_cluster_kubeconfig(kubeconfig: Path):
-    cmd = ["sudo", "k8s", "config"]
-    kubeconfig_content = utils.run_command(cmd, capture_output=True)
-    with open(kubeconfig, "w", encoding="utf-8") as f:
-        f.write(kubeconfig_content)
+def _cluster_is_available(cluster: dict) -> bool:
+    conditions = cluster.get("status", {}).get("v1beta2", {}).get("conditions", [])
+    return any(
+        condition["type"] == "Available" and condition["status"] == "True"
+        for condition in conditions
+    )
 
 
-def _get_workload_kubeconfig(
-    namespace: str, cluster_name: str, management_config: Path, workload_config: Path
+def _wait_for_cluster(
+    namespace: str, cluster_name: str, management_kubeconfig: Path, timeout: int
 ):
-    cmd = [
-        "clusterctl",
-        "get",
-        "kubeconfig",
-        "--namespace",
-        namespace,
-        cluster_name,
-        "--kubeconfig",
-        str(management_config),
-    ]
-    kubeconfig_content = utils.run_command(cmd, capture_output=True)
-    with open(workload_config, "w", encoding="utf-8") as f:
-        f.write(kubeconfig_content)
+    from kubernetes import client as k8s_client
+    from kubernetes import config as k8s_config
+    from kubernetes import watch as k8s_watch
+
+    # Watch the CAPI Cluster object so the server pushes status updates
+    # and we return on the first Available=True event, instead of
+    # kubectl wait polling once per second for up to the full timeout
+    api = k8s_client.CustomObjectsApi(
+        k8s_config.new_client_from_config(config_file=str(management_kubeconfig))
+    )
+    watch = k8s_watch.Watch()
+    for event in watch.stream(
+        api.list_namespaced_custom_object,
+        group="cluster.x-k8s.io",
+        version="v1beta1",
+        namespace=namespace,
+        plural="clusters",
+        field_selector=f"metadata.name={cluster_name}",
+        timeout_seconds=timeout,
+    ):
+        if _cluster_is_available(event["object"]):
+            watch.stop()
+            return
+    raise TimeoutError(f"Cluster {cluster_name} not Available after {timeout}s")
 
 
 def _check_workload_nodes_status(workload_kubeconfig: Path, expected_nodes: int):
-    cmd = [
-        "sudo",
-        "k8s",
+    cmd = utils.k8s_command(
         "kubectl",
         "wait",
         "nodes",
@@ -98,72 +90,96 @@ def _check_workload_nodes_status(workload_kubeconfig: Path, expected_nodes: int)
         f"{WORKLOAD_NODE_READY_TIMEOUT}s",
         "--kubeconfig",
         str(workload_kubeconfig),
-    ]
+    )
     utils.run_command(cmd, capture_output=False)
 
-    cmd = [
-        "sudo",
-        "k8s",
+    # Let the server extract one Ready status per node instead of
+    # shipping and parsing the full node objects as YAML
+    cmd = utils.k8s_command(
         "kubectl",
         "get",
         "nodes",
         "--output",
-        "yaml",
+        'jsonpath={range .items[*]}'
+        '{.status.conditions[?(@.type=="Ready")].status}{"\\n"}{end}',
         "--kubeconfig",
         str(workload_kubeconfig),
-    ]
-    nodes_str = utils.run_command(cmd, capture_output=True)
-    nodes = yaml.safe_load(nodes_str)
+    )
+    ready_statuses = utils.run_command(cmd, capture_output=True).splitlines()
 
     # Check if number of nodes are as expected
-    assert len(nodes.get("items", [])) == expected_nodes
+    assert len(ready_statuses) == expected_nodes
 
     # Check if the nodes are in ready state
-    for node in nodes.get("items", []):
-        for condition in node.get("conditions", []):
-            if condition.get("Type") == "Ready":
-                assert condition.get("status") is True
+    assert all(status == "True" for status in ready_statuses)
 
 
-def _check_workload_pods(workload_kubeconfig: Path, namespace: str):
-    cmd = [
-        "sudo",
-        "k8s",
-        "kubectl",
-        "--namespace",
-        namespace,
-        "wait",
-        "pods",
-        "--for",
-        "condition=Ready=True",
-        "--all",
-        "--timeout",
-        f"{POD_WAIT_TIMEOUT}s",
-        "--kubeconfig",
-        str(workload_kubeconfig),
-    ]
-    utils.run_command(cmd, capture_output=False)
+def _pod_is_ready(pod) -> bool:
+    for condition in pod.status.conditions or []:
+        if condition.type == "Ready":
+            return condition.status == "True"
+    return False
 
 
-def test_create_cluster(
+def _check_workload_pods(workload_kubeconfig: Path):
+    from kubernetes import client as k8s_client
+    from kubernetes import config as k8s_config
+    from kubernetes import watch as k8s_watch
+
+    # A single watch across all namespaces covers kube-system,
+    # openstack-system and kubernetes-dashboard over one API connection,
+    # with the server pushing updates instead of kubectl polling
+    core = k8s_client.CoreV1Api(
+        k8s_config.new_client_from_config(config_file=str(workload_kubeconfig))
+    )
+
+    pods = core.list_pod_for_all_namespaces()
+    not_ready = {
+        (pod.metadata.namespace, pod.metadata.name)
+        for pod in pods.items
+        if not _pod_is_ready(pod)
+    }
+    if not not_ready:
+        return
+
+    watch = k8s_watch.Watch()
+    for event in watch.stream(
+        core.list_pod_for_all_namespaces,
+        resource_version=pods.metadata.resource_version,
+        timeout_seconds=POD_WAIT_TIMEOUT,
+    ):
+        pod = event["object"]
+        if event["type"] == "DELETED" or _pod_is_ready(pod):
+            not_ready.discard((pod.metadata.namespace, pod.metadata.name))
+            if not not_ready:
+                watch.stop()
+                break
+
+    assert not not_ready, (
+        f"Pods not Ready after {POD_WAIT_TIMEOUT}s: {sorted(not_ready)}"
+    )
+
+
+def test_cluster_deploys(
     setup,
     value_overrides,
     helm_repo_path,
     openstack_cluster_chart_version,
     config_path,
-    unique_id,
+    namespace,
+    cluster_name,
+    management_kubeconfig,
 ):
     """Test create cluster.
 
-    Create a workload cluster.
-    Verify if the workload cluster pods are in running state.
+    Create a workload cluster and wait for it to become available.
     """
+    # JSON is valid YAML and helm reads it fine via --values, while
+    # json.dump serializes the nested values dict much faster than
+    # yaml.dump
     values_file = config_path / "values.yaml"
     with open(str(values_file), "w") as file:
-        yaml.dump(value_overrides, file)
-
-    namespace = f"{utils.NAMESPACE}-{unique_id}"
-    cluster_name = f"{utils.CLUSTER_NAME}-{unique_id}"
+        json.dump(value_overrides, file)
 
     _create_cluster(
         namespace,
@@ -174,25 +190,22 @@ def test_create_cluster(
     )
 
     # Wait for cluster to be active
-    _wait_for_cluster(namespace, cluster_name, timeout=CLUSTER_DEPLOY_TIMEOUT)
-
-    # Get management cluster and workload cluster kubeconfig files
-    management_kc_file = config_path / "mgmt_kubeconfig"
-    _get_management_cluster_kubeconfig(management_kc_file)
-    workload_kc_file = config_path / "workload_kubeconfig"
-    _get_workload_kubeconfig(
-        namespace, cluster_name, management_kc_file, workload_kc_file
+    _wait_for_cluster(
+        namespace, cluster_name, management_kubeconfig, timeout=CLUSTER_DEPLOY_TIMEOUT
     )
 
+
+def test_workload_nodes_ready(workload_kubeconfig):
+    """Verify the workload cluster nodes are in ready state."""
     # Expected 2 nodes - 1 master and 1 worker
-    _check_workload_nodes_status(workload_kc_file, 2)
+    _check_workload_nodes_status(workload_kubeconfig, 2)
 
-    # Check if k8s pods are running fine in kube-system namespace
-    # This also verified k8s-keystone-auth pods
-    _check_workload_pods(workload_kc_file, namespace="kube-system")
 
-    # Check openstack cinder and controller manager
-    _check_workload_pods(workload_kc_file, namespace="openstack-system")
+def test_addons_ready(workload_kubeconfig):
+    """Verify the workload cluster pods are in running state.
 
-    # Check kubernetes dashboard
-    _check_workload_pods(workload_kc_file, namespace="kubernetes-dashboard")
+    This covers k8s-keystone-auth in kube-system, openstack cinder and
+    controller manager in openstack-system, and the kubernetes
+    dashboard.
+    """
+    _check_workload_pods(workload_kubeconfig)
@@ -1,13 +1,22 @@
 # SPDX-FileCopyrightText: 2025 - Canonical Ltd
 # SPDX-License-Identifier: Apache-2.0
 
-import copy
+from __future__ import annotations
+
+import base64
+import functools
+import json
 import logging
 import os
+import pickle
+import shutil
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-import yaml
+if TYPE_CHECKING:
+    import openstack
 
 
 NAMESPACE = "magnum-test-cluster"
@@ -95,35 +104,152 @@ DEFAULT_VALUES = {
 LOG = logging.getLogger(__name__)
 
 
+@functools.cache
+def _yaml():
+    """Import PyYAML on first use so pytest collection does not pay for it.
+
+    Returns the module together with the fastest available safe loader
+    and dumper (the libyaml C bindings when compiled in, which are
+    roughly 10x faster than the pure-python ones).
+    """
+    import yaml
+
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+    return yaml, loader, dumper
+
+
+DEBUG_CACHE_FILE = Path("/tmp/capi_helm_cache.pickle")
+
+
+def debug_caching_enabled() -> bool:
+    """Whether DEBUG_CACHING=1 requests reuse of a previous run's setup.
+
+    Enabled for local iteration: repeated runs then reuse the keypair,
+    flavor, namespace and application credential created by an earlier
+    run instead of recreating them. CI leaves the variable unset and
+    exercises the full path.
+    """
+    return os.environ.get("DEBUG_CACHING") == "1"
+
+
+def load_debug_cache() -> dict | None:
+    """Load the payload pickled by a previous DEBUG_CACHING run.
+
+    Returns None when debug caching is disabled or no cache exists. The
+    payload carries the previous run's unique_id alongside the values so
+    the whole session (namespace, cluster name, secret names) stays
+    consistent with the resources being reused.
+    """
+    if not debug_caching_enabled() or not DEBUG_CACHE_FILE.exists():
+        return None
+    LOG.debug(f"Loading debug cache from {DEBUG_CACHE_FILE}")
+    return pickle.loads(DEBUG_CACHE_FILE.read_bytes())
+
+
+def save_debug_cache(payload: dict):
+    """Persist the payload for reuse by later DEBUG_CACHING runs."""
+    if debug_caching_enabled():
+        DEBUG_CACHE_FILE.write_bytes(pickle.dumps(payload))
+
+
+# Each 'sudo k8s ...' invocation pays PAM auth and a setuid fork on top
+# of the k8s snap itself. Skip the prefix when already root, or when
+# K8S_NO_SUDO=1 signals the test user may run k8s directly (e.g. CI
+# provisioned with a sudoers rule such as
+# 'runner ALL=(root) NOPASSWD: /snap/bin/k8s' and an alias, or group
+# membership granting access to the snap)
+_K8S_PREFIX = (
+    ["k8s"]
+    if os.geteuid() == 0 or os.environ.get("K8S_NO_SUDO") == "1"
+    else ["sudo", "k8s"]
+)
+
+
+def k8s_command(*args: str) -> list:
+    """Build a k8s snap command, prefixed with sudo only when needed."""
+    return [*_K8S_PREFIX, *args]
+
+
+@functools.cache
+def _resolve_binary(name: str) -> str:
+    """Resolve a binary name to an absolute path once per session.
+
+    Passing absolute paths to subprocess skips the PATH scan execvp
+    would otherwise repeat on every invocation.
+    """
+    return shutil.which(name) or name
+
+
+# Shared keyword arguments trimming per-call fork cost: no stdin pipe to
+# set up, and no /proc/self/fd walk to close inherited descriptors
+_SUBPROCESS_KWARGS = {"stdin": subprocess.DEVNULL, "close_fds": False}
+
+
 def run_command(cmd: list, env: dict | None = None, capture_output=False):
     """Execute commands using subprocess."""
     LOG.debug(f"Running command {cmd}")
+    cmd = [_resolve_binary(cmd[0]), *cmd[1:]]
     if capture_output:
-        output = subprocess.check_output(cmd, env=env, text=True)
+        output = subprocess.check_output(cmd, env=env, text=True, **_SUBPROCESS_KWARGS)
         return output.strip()
     else:
-        return subprocess.check_call(cmd, env=env, text=True)
+        return subprocess.check_call(cmd, env=env, text=True, **_SUBPROCESS_KWARGS)
 
 
-def run_openstack_command(cloud_name: str, cmd: list, capture_output=False):
-    """Run openstack command using clouds.yaml."""
-    env = os.environ.copy()
-    env["OS_CLOUD"] = cloud_name
+def run_command_bytes(cmd: list, env: dict | None = None) -> bytes:
+    """Execute a command and return its raw stdout bytes.
 
-    return run_command(cmd, env=env, capture_output=capture_output)
+    Skips the text decode/encode round-trip that run_command pays with
+    capture_output, which matters for multi-KB outputs such as
+    kubeconfig files that are written straight back to disk.
+    """
+    LOG.debug(f"Running command {cmd}")
+    cmd = [_resolve_binary(cmd[0]), *cmd[1:]]
+    return subprocess.check_output(cmd, env=env, **_SUBPROCESS_KWARGS)
 
 
 def create_namespace(name: str):
-    cmd = ["sudo", "k8s", "kubectl", "create", "namespace", name]
+    cmd = k8s_command("kubectl", "create", "namespace", name)
     run_command(cmd)
 
 
+def get_management_cluster_kubeconfig(kubeconfig: Path):
+    """Write the management cluster kubeconfig to the given path."""
+    cmd = k8s_command("config")
+    kubeconfig.write_bytes(run_command_bytes(cmd))
+
+
+def get_workload_kubeconfig(
+    namespace: str, cluster_name: str, management_config: Path, workload_config: Path
+):
+    """Write the workload cluster kubeconfig to the given path.
+
+    Reads the kubeconfig secret CAPI maintains for the cluster directly
+    instead of forking clusterctl for it.
+    """
+    from kubernetes import client as k8s_client
+    from kubernetes import config as k8s_config
+
+    core = k8s_client.CoreV1Api(
+        k8s_config.new_client_from_config(config_file=str(management_config))
+    )
+    secret = core.read_namespaced_secret(f"{cluster_name}-kubeconfig", namespace)
+    workload_config.write_bytes(base64.b64decode(secret.data["value"]))
+
+
+@functools.cache
 def get_admin_credentials() -> dict:
-    """Retrieve admin credentials from clouds.yaml."""
+    """Retrieve admin credentials from clouds.yaml.
+
+    The result is cached for the session; callers must treat the
+    returned dict as read-only.
+    """
+    yaml, loader, _ = _yaml()
     cloud_file = Path(os.environ["HOME"]) / ".config" / "openstack" / "clouds.yaml"
     try:
         with open(cloud_file, "r", encoding="utf-8") as f:
-            data = yaml.safe_load(f)
+            data = yaml.load(f, Loader=loader)
             return data["clouds"][CLOUD_ADMIN]
     except FileNotFoundError:
         print(f"Error: The file {cloud_file} was not found.")
@@ -131,19 +257,13 @@ def get_admin_credentials() -> dict:
         print(f"Error parsing YAML file: {exc}")
 
 
-def create_application_credential_secret(namespace: str, suffix: str) -> str:
+def create_application_credential_secret(
+    conn: openstack.connection.Connection, namespace: str, suffix: str
+) -> str:
     """Generate application credential and create a k8s secret."""
-    cmd = [
-        "openstack",
-        "application",
-        "credential",
-        "create",
-        f"{APPCRED_NAME}-{suffix}",
-        "--format",
-        "yaml",
-    ]
-    app_cred_str = run_openstack_command(CLOUD_ADMIN, cmd, capture_output=True)
-    app_cred = yaml.safe_load(app_cred_str)
+    app_cred = conn.identity.create_application_credential(
+        user=conn.current_user_id, name=f"{APPCRED_NAME}-{suffix}"
+    )
     admin_cred = get_admin_credentials()
 
     clouds_dict = {
@@ -155,20 +275,21 @@ def create_application_credential_secret(namespace: str, suffix: str) -> str:
                 "verify": False,
                 "auth": {
                     "auth_url": admin_cred["auth"]["auth_url"],
-                    "application_credential_id": app_cred["id"],
-                    "application_credential_secret": app_cred["secret"],
+                    "application_credential_id": app_cred.id,
+                    "application_credential_secret": app_cred.secret,
                 },
                 "auth_type": "v3applicationcredential",
             },
         },
     }
 
-    clouds_data_string = yaml.safe_dump(clouds_dict, indent=2, default_flow_style=False)
+    yaml, _, dumper = _yaml()
+    clouds_data_string = yaml.dump(
+        clouds_dict, Dumper=dumper, indent=2, default_flow_style=False
+    )
 
     secret_name = f"{CLUSTER_NAME}-{suffix}-cloud-credentials"
-    cmd = [
-        "sudo",
-        "k8s",
+    cmd = k8s_command(
         "kubectl",
         "create",
         "secret",
@@ -177,73 +298,63 @@ def create_application_credential_secret(namespace: str, suffix: str) -> str:
         f"--from-literal=clouds.yaml={clouds_data_string}",
         "--namespace",
         namespace,
-    ]
+    )
     run_command(cmd, capture_output=False)
     return secret_name
 
 
-def get_openstack_image_id(image: str) -> str:
-    """Get ID for a given Image."""
-    # Assumption: Only one image with the name exists
-    cmd = ["openstack", "image", "show", image, "-c", "id", "-f", "value"]
-    return run_openstack_command(CLOUD_ADMIN, cmd, capture_output=True)
-
-
-def get_openstack_network_id(network_name: str) -> str:
-    """Get ID for a given network."""
-    # Assumption: Only one network with the name exists
-    cmd = ["openstack", "network", "show", network_name, "-c", "id", "-f", "value"]
-    return run_openstack_command(CLOUD_ADMIN, cmd, capture_output=True)
-
-
-def get_openstack_project_id(project: str, domain: str) -> str:
-    """Get Project ID based on name and domain name."""
-    cmd = [
-        "openstack",
-        "project",
-        "show",
-        project,
-        "--domain",
-        domain,
-        "-c",
-        "id",
-        "-f",
-        "value",
-    ]
-    return run_openstack_command(CLOUD_ADMIN, cmd, capture_output=True)
+@functools.cache
+def get_openstack_connection() -> openstack.connection.Connection:
+    """Return the process-wide openstack connection.
+
+    openstacksdk multiplexes every service call over one keystoneauth
+    session, so memoizing the connection shares the auth token, TLS
+    handshake and HTTP connection pool across all lookups and creates.
+    """
+    import openstack
+
+    return openstack.connect(cloud=CLOUD_ADMIN)
+
+
+def get_openstack_inventory(conn: openstack.connection.Connection) -> dict:
+    """Preload IDs of openstack images, networks and projects.
+
+    Listing each resource type once and filtering in-process avoids one
+    API round-trip per lookup. Projects are listed for the domain
+    configured in clouds.yaml only, so a duplicate project name in
+    another domain cannot shadow the lookup.
+    """
+    _project, domain = _get_project_and_domain_from_clouds_yaml()
+    domain_id = conn.identity.find_domain(domain, ignore_missing=False).id
+    # Assumption: Only one resource with a given name exists
+    return {
+        "images": {image.name: image.id for image in conn.image.images()},
+        "networks": {network.name: network.id for network in conn.network.networks()},
+        "projects": {
+            project.name: project.id
+            for project in conn.identity.projects(domain_id=domain_id)
+        },
+    }
 
 
-def create_keypair(config_path: Path, suffix: str) -> str:
+def create_keypair(
+    conn: openstack.connection.Connection, config_path: Path, suffix: str
+) -> str:
     """Create Keypair in openstack and return keypair name."""
     keypair = f"{KEYPAIR_NAME}-{suffix}"
-    cmd = [
-        "openstack",
-        "keypair",
-        "create",
-        "--private-key",
-        f"{str(config_path)}/{keypair}.key",
-        keypair,
-    ]
-    run_openstack_command(CLOUD_ADMIN, cmd, capture_output=False)
+    created = conn.compute.create_keypair(name=keypair)
+    private_key_file = config_path / f"{keypair}.key"
+    private_key_file.write_text(created.private_key)
+    private_key_file.chmod(0o600)
     return keypair
 
 
-def create_flavor(ram: int, disk: int, vcpus: int, suffix: str) -> str:
+def create_flavor(
+    conn: openstack.connection.Connection, ram: int, disk: int, vcpus: int, suffix: str
+) -> str:
     """Create flavor in openstack and return flavor name."""
     flavor = f"{FLAVOR_NAME}-{suffix}"
-    cmd = [
-        "openstack",
-        "flavor",
-        "create",
-        "--ram",
-        str(ram),
-        "--disk",
-        str(disk),
-        "--vcpus",
-        str(vcpus),
-        flavor,
-    ]
-    run_openstack_command(CLOUD_ADMIN, cmd, capture_output=False)
+    conn.compute.create_flavor(name=flavor, ram=ram, disk=disk, vcpus=vcpus)
     return flavor
 
 
@@ -252,21 +363,38 @@ def _get_project_and_domain_from_clouds_yaml() -> (str, str):
     return admin_cred["auth"]["project_name"], admin_cred["auth"]["project_domain_name"]
 
 
-def generate_values(config_path: Path, unique_id: str) -> dict:
+def generate_values(
+    conn: openstack.connection.Connection,
+    config_path: Path,
+    unique_id: str,
+    inventory: dict,
+) -> dict:
     """Generate values yaml to create cluster."""
-    values = copy.deepcopy(DEFAULT_VALUES)
-    project, domain = _get_project_and_domain_from_clouds_yaml()
-
-    keypair = create_keypair(config_path, unique_id)
-    flavor = create_flavor(4096, 30, 2, unique_id)
-    image_id = get_openstack_image_id("ubuntu")
-    external_network_id = get_openstack_network_id("external-network")
-    project_id = get_openstack_project_id(project, domain)
+    # A JSON round-trip deep-copies this plain-data dict roughly an
+    # order of magnitude faster than copy.deepcopy
+    values = json.loads(json.dumps(DEFAULT_VALUES))
+    project, _domain = _get_project_and_domain_from_clouds_yaml()
 
     namespace = f"{NAMESPACE}-{unique_id}"
-    create_namespace(namespace)
-    # clouds_dict = generate_application_credential_cloud_config(unique_id)
-    appcred_secret = create_application_credential_secret(namespace, unique_id)
+
+    def _namespace_and_appcred() -> str:
+        # The secret can only be created once its namespace exists
+        create_namespace(namespace)
+        return create_application_credential_secret(conn, namespace, unique_id)
+
+    # The setup calls operate on distinct resources, so overlap their
+    # network waits instead of paying for them serially
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        keypair_future = executor.submit(create_keypair, conn, config_path, unique_id)
+        flavor_future = executor.submit(create_flavor, conn, 4096, 30, 2, unique_id)
+        appcred_future = executor.submit(_namespace_and_appcred)
+        keypair = keypair_future.result()
+        flavor = flavor_future.result()
+        appcred_secret = appcred_future.result()
+
+    image_id = inventory["images"]["ubuntu"]
+    external_network_id = inventory["networks"]["external-network"]
+    project_id = inventory["projects"][project]
     admin_cred = get_admin_credentials()
 
     # values["clouds"] = clouds_dict["clouds"]